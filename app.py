@@ -1,53 +1,144 @@
+import functools
+import logging
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
 from flask import Flask, render_template, request, jsonify
-from utils import initialize_data_files, create_sample_data, load_json, save_json, generate_id
+from flask.json.provider import DefaultJSONProvider
+from utils import initialize_data_files, create_sample_data, generate_id, DataStore, orjson
 from models import Course, Teacher, Room, TimeSlot, StudentGroup
-from csp_solver import TimetableSolver
+from csp_solver import solve_timetable
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class OrjsonProvider(DefaultJSONProvider):
+    """
+    Flask JSON provider backed by orjson, so jsonify skips the stdlib encoder
+    """
+    
+    def dumps(self, obj, **kwargs):
+        option = orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if kwargs.get('indent'):
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=self.default, option=option).decode('utf-8')
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
 
 app = Flask(__name__)
 app.secret_key = 'your-secret-key-here'
+if orjson is not None:
+    app.json = OrjsonProvider(app)
+
+# Solver worker processes re-import this module when they are spawned;
+# only the serving process may touch the data files
+is_server_process = multiprocessing.current_process().name == 'MainProcess'
 
 # Initialize data files and create sample data on startup
-initialize_data_files()
-sample_data = create_sample_data()
-print(f"Application initialized with {sample_data}")
+if is_server_process:
+    initialize_data_files()
+    sample_data = create_sample_data()
+    print(f"Application initialized with {sample_data}")
+
+# Serve all collections from memory; changes are written back in the background
+store = DataStore()
+if is_server_process:
+    store.start_writeback()
+
+# Timetables are solved in worker processes so a long solve neither ties up
+# a request thread nor competes for the GIL; workers start on first use
+executor = ProcessPoolExecutor(max_workers=os.cpu_count(),
+                               mp_context=multiprocessing.get_context('spawn'))
+_jobs = {}  # {job_id: Future}
+_finished_at = {}  # {job_id: time.monotonic() when the job finished}
+_jobs_lock = threading.Lock()
+JOB_TTL = 600  # seconds a finished job stays available to poll
+
+# Rendered HTML of the static pages, keyed by (endpoint, script root)
+_page_cache = {}
+
+def render_page(template_name):
+    """
+    Render a page that takes no input once and serve the cached HTML afterwards
+    Caching is skipped in debug mode so template edits show up immediately
+    """
+    if app.debug:
+        return render_template(template_name)
+    
+    key = (request.endpoint, request.script_root)
+    html = _page_cache.get(key)
+    if html is None:
+        html = _page_cache[key] = render_template(template_name)
+    return html
 
 @app.route('/')
 def index():
-    return render_template('index.html')
+    return render_page('index.html')
 
 @app.route('/courses')
 def courses():
-    return render_template('manage_courses.html')
+    return render_page('manage_courses.html')
 
 @app.route('/teachers')
 def teachers():
-    return render_template('manage_teachers.html')
+    return render_page('manage_teachers.html')
 
 @app.route('/rooms')
 def rooms():
-    return render_template('manage_rooms.html')
+    return render_page('manage_rooms.html')
 
 @app.route('/timeslots')
 def timeslots():
-    return render_template('manage_timeslots.html')
+    return render_page('manage_timeslots.html')
 
 @app.route('/groups')
 def groups():
-    return render_template('manage_groups.html')
+    return render_page('manage_groups.html')
 
 @app.route('/generate')
 def generate():
-    return render_template('generate.html')
+    return render_page('generate.html')
 
 @app.route('/view-timetable')
 def view_timetable():
-    return render_template('view_timetable.html')
+    return render_page('view_timetable.html')
 
 # API Routes for Courses
+# Collection endpoints: their size can be read with HEAD and GETs carry an ETag
+_collection_paths = {f'/api/{name}': name for name in DataStore.COLLECTIONS}
+
+@app.before_request
+def count_collection():
+    """
+    Answer HEAD on a collection endpoint with its size in X-Count,
+    without serializing the records
+    """
+    if request.method == 'HEAD' and request.path in _collection_paths:
+        count = store.count(_collection_paths[request.path])
+        return '', 200, {'X-Count': str(count)}
+
+@app.after_request
+def tag_collection(response):
+    """
+    Add an ETag to collection GETs and answer a matching If-None-Match
+    with 304 Not Modified and no body
+    """
+    if request.method == 'GET' and request.path in _collection_paths and response.status_code == 200:
+        response.add_etag()
+        response.make_conditional(request)
+    return response
+
 @app.route('/api/courses', methods=['GET'])
 def get_courses():
     try:
-        courses = load_json('courses.json')
+        courses = store.get('courses')
         return jsonify(courses)
     except Exception as e:
         print(f"Error loading courses: {str(e)}")
@@ -66,11 +157,6 @@ def add_course():
             if not data.get(field):
                 return jsonify({'success': False, 'message': f'{field.replace("_", " ").title()} is required'}), 400
         
-        # Check for duplicate course code
-        courses = load_json('courses.json')
-        if any(course['code'] == data['code'] for course in courses):
-            return jsonify({'success': False, 'message': 'Course code already exists'}), 400
-        
         course = Course(
             id=generate_id(),
             code=data.get('code'),
@@ -79,11 +165,14 @@ def add_course():
             course_type=data.get('course_type')
         )
         
-        courses.append(course.to_dict())
-        if save_json('courses.json', courses):
-            return jsonify({'success': True, 'course': course.to_dict()})
-        else:
-            return jsonify({'success': False, 'message': 'Failed to save course'}), 500
+        with store.lock:
+            # Check for duplicate course code
+            courses = store.get('courses')
+            if any(existing['code'] == data['code'] for existing in courses):
+                return jsonify({'success': False, 'message': 'Course code already exists'}), 400
+            store.add('courses', course.to_dict())
+        
+        return jsonify({'success': True, 'course': course.to_dict()})
             
     except Exception as e:
         print(f"Error adding course: {str(e)}")
@@ -92,25 +181,21 @@ def add_course():
 @app.route('/api/courses/<course_id>', methods=['PUT'])
 def update_course(course_id):
     data = request.json
-    courses = load_json('courses.json')
-    for i, course in enumerate(courses):
-        if course['id'] == course_id:
-            courses[i].update(data)
-            save_json('courses.json', courses)
-            return jsonify({'success': True, 'course': courses[i]})
-    return jsonify({'success': False, 'message': 'Course not found'}), 404
+    course = store.update('courses', course_id, data)
+    if course is None:
+        return jsonify({'success': False, 'message': 'Course not found'}), 404
+    return jsonify({'success': True, 'course': course})
 
 @app.route('/api/courses/<course_id>', methods=['DELETE'])
 def delete_course(course_id):
-    courses = load_json('courses.json')
-    courses = [course for course in courses if course['id'] != course_id]
-    save_json('courses.json', courses)
+    if store.delete('courses', course_id) is None:
+        return jsonify({'success': False, 'message': 'Course not found'}), 404
     return jsonify({'success': True})
 
 # API Routes for Teachers
 @app.route('/api/teachers', methods=['GET'])
 def get_teachers():
-    teachers = load_json('teachers.json')
+    teachers = store.get('teachers')
     return jsonify(teachers)
 
 @app.route('/api/teachers', methods=['POST'])
@@ -121,33 +206,27 @@ def add_teacher():
         name=data.get('name'),
         department=data.get('department')
     )
-    teachers = load_json('teachers.json')
-    teachers.append(teacher.to_dict())
-    save_json('teachers.json', teachers)
+    store.add('teachers', teacher.to_dict())
     return jsonify({'success': True, 'teacher': teacher.to_dict()})
 
 @app.route('/api/teachers/<teacher_id>', methods=['PUT'])
 def update_teacher(teacher_id):
     data = request.json
-    teachers = load_json('teachers.json')
-    for i, teacher in enumerate(teachers):
-        if teacher['id'] == teacher_id:
-            teachers[i].update(data)
-            save_json('teachers.json', teachers)
-            return jsonify({'success': True, 'teacher': teachers[i]})
-    return jsonify({'success': False, 'message': 'Teacher not found'}), 404
+    teacher = store.update('teachers', teacher_id, data)
+    if teacher is None:
+        return jsonify({'success': False, 'message': 'Teacher not found'}), 404
+    return jsonify({'success': True, 'teacher': teacher})
 
 @app.route('/api/teachers/<teacher_id>', methods=['DELETE'])
 def delete_teacher(teacher_id):
-    teachers = load_json('teachers.json')
-    teachers = [teacher for teacher in teachers if teacher['id'] != teacher_id]
-    save_json('teachers.json', teachers)
+    if store.delete('teachers', teacher_id) is None:
+        return jsonify({'success': False, 'message': 'Teacher not found'}), 404
     return jsonify({'success': True})
 
 # API Routes for Rooms
 @app.route('/api/rooms', methods=['GET'])
 def get_rooms():
-    rooms = load_json('rooms.json')
+    rooms = store.get('rooms')
     return jsonify(rooms)
 
 @app.route('/api/rooms', methods=['POST'])
@@ -159,33 +238,27 @@ def add_room():
         capacity=data.get('capacity'),
         room_type=data.get('room_type')
     )
-    rooms = load_json('rooms.json')
-    rooms.append(room.to_dict())
-    save_json('rooms.json', rooms)
+    store.add('rooms', room.to_dict())
     return jsonify({'success': True, 'room': room.to_dict()})
 
 @app.route('/api/rooms/<room_id>', methods=['PUT'])
 def update_room(room_id):
     data = request.json
-    rooms = load_json('rooms.json')
-    for i, room in enumerate(rooms):
-        if room['id'] == room_id:
-            rooms[i].update(data)
-            save_json('rooms.json', rooms)
-            return jsonify({'success': True, 'room': rooms[i]})
-    return jsonify({'success': False, 'message': 'Room not found'}), 404
+    room = store.update('rooms', room_id, data)
+    if room is None:
+        return jsonify({'success': False, 'message': 'Room not found'}), 404
+    return jsonify({'success': True, 'room': room})
 
 @app.route('/api/rooms/<room_id>', methods=['DELETE'])
 def delete_room(room_id):
-    rooms = load_json('rooms.json')
-    rooms = [room for room in rooms if room['id'] != room_id]
-    save_json('rooms.json', rooms)
+    if store.delete('rooms', room_id) is None:
+        return jsonify({'success': False, 'message': 'Room not found'}), 404
     return jsonify({'success': True})
 
 # API Routes for TimeSlots
 @app.route('/api/timeslots', methods=['GET'])
 def get_timeslots():
-    timeslots = load_json('timeslots.json')
+    timeslots = store.get('timeslots')
     return jsonify(timeslots)
 
 @app.route('/api/timeslots', methods=['POST'])
@@ -198,33 +271,27 @@ def add_timeslot():
         start_time=data.get('start_time'),
         end_time=data.get('end_time')
     )
-    timeslots = load_json('timeslots.json')
-    timeslots.append(timeslot.to_dict())
-    save_json('timeslots.json', timeslots)
+    store.add('timeslots', timeslot.to_dict())
     return jsonify({'success': True, 'timeslot': timeslot.to_dict()})
 
 @app.route('/api/timeslots/<timeslot_id>', methods=['PUT'])
 def update_timeslot(timeslot_id):
     data = request.json
-    timeslots = load_json('timeslots.json')
-    for i, timeslot in enumerate(timeslots):
-        if timeslot['id'] == timeslot_id:
-            timeslots[i].update(data)
-            save_json('timeslots.json', timeslots)
-            return jsonify({'success': True, 'timeslot': timeslots[i]})
-    return jsonify({'success': False, 'message': 'TimeSlot not found'}), 404
+    timeslot = store.update('timeslots', timeslot_id, data)
+    if timeslot is None:
+        return jsonify({'success': False, 'message': 'TimeSlot not found'}), 404
+    return jsonify({'success': True, 'timeslot': timeslot})
 
 @app.route('/api/timeslots/<timeslot_id>', methods=['DELETE'])
 def delete_timeslot(timeslot_id):
-    timeslots = load_json('timeslots.json')
-    timeslots = [timeslot for timeslot in timeslots if timeslot['id'] != timeslot_id]
-    save_json('timeslots.json', timeslots)
+    if store.delete('timeslots', timeslot_id) is None:
+        return jsonify({'success': False, 'message': 'TimeSlot not found'}), 404
     return jsonify({'success': True})
 
 # API Routes for Groups
 @app.route('/api/groups', methods=['GET'])
 def get_groups():
-    groups = load_json('groups.json')
+    groups = store.get('groups')
     return jsonify(groups)
 
 @app.route('/api/groups', methods=['POST'])
@@ -236,44 +303,120 @@ def add_group():
         semester=data.get('semester'),
         department=data.get('department')
     )
-    groups = load_json('groups.json')
-    groups.append(group.to_dict())
-    save_json('groups.json', groups)
+    store.add('groups', group.to_dict())
     return jsonify({'success': True, 'group': group.to_dict()})
 
 @app.route('/api/groups/<group_id>', methods=['PUT'])
 def update_group(group_id):
     data = request.json
-    groups = load_json('groups.json')
-    for i, group in enumerate(groups):
-        if group['id'] == group_id:
-            groups[i].update(data)
-            save_json('groups.json', groups)
-            return jsonify({'success': True, 'group': groups[i]})
-    return jsonify({'success': False, 'message': 'Group not found'}), 404
+    group = store.update('groups', group_id, data)
+    if group is None:
+        return jsonify({'success': False, 'message': 'Group not found'}), 404
+    return jsonify({'success': True, 'group': group})
 
 @app.route('/api/groups/<group_id>', methods=['DELETE'])
 def delete_group(group_id):
-    groups = load_json('groups.json')
-    groups = [group for group in groups if group['id'] != group_id]
-    save_json('groups.json', groups)
+    if store.delete('groups', group_id) is None:
+        return jsonify({'success': False, 'message': 'Group not found'}), 404
     return jsonify({'success': True})
 
+# Bulk import API
+# {entity: (model class, required fields, unique field)}
+BULK_ENTITIES = {
+    'courses': (Course, ['code', 'name', 'sessions_per_week', 'course_type'], 'code'),
+    'teachers': (Teacher, ['name'], None),
+    'rooms': (Room, ['room_number', 'room_type'], None),
+    'timeslots': (TimeSlot, ['day', 'period'], None),
+    'groups': (StudentGroup, ['name'], None)
+}
+
+def _bulk_add(name, model_cls, items, required_fields, unique_field=None):
+    """
+    Validate and append a batch of items in one store update
+
+    Returns (created, error_message); nothing is stored if any item is invalid
+    """
+    with store.lock:
+        records = store.get(name)
+        seen = {record.get(unique_field) for record in records} if unique_field else set()
+        created = []
+        
+        for index, item in enumerate(items, 1):
+            if not isinstance(item, dict):
+                return None, f'Item {index}: expected an object'
+            for field in required_fields:
+                if not item.get(field):
+                    return None, f'Item {index}: {field.replace("_", " ").title()} is required'
+            if unique_field:
+                if not isinstance(item[unique_field], str):
+                    return None, f'Item {index}: {unique_field.replace("_", " ").title()} must be a string'
+                if item[unique_field] in seen:
+                    return None, f'Item {index}: {unique_field.replace("_", " ").title()} {item[unique_field]} already exists'
+                seen.add(item[unique_field])
+            created.append(model_cls.from_dict({**item, 'id': generate_id()}).to_dict())
+        
+        store.extend(name, created)
+    return created, None
+
+@app.route('/api/<entity>/bulk', methods=['POST'])
+def bulk_add(entity):
+    if entity not in BULK_ENTITIES:
+        return jsonify({'success': False, 'message': f'Unknown entity: {entity}'}), 404
+    
+    items = request.json
+    if not isinstance(items, list) or not items:
+        return jsonify({'success': False, 'message': 'A non-empty list of items is required'}), 400
+    
+    model_cls, required_fields, unique_field = BULK_ENTITIES[entity]
+    created, error = _bulk_add(entity, model_cls, items, required_fields, unique_field)
+    if error:
+        return jsonify({'success': False, 'message': error}), 400
+    return jsonify({'success': True, entity: created})
+
 # Timetable Generation API
+def _save_generated_timetable(future):
+    """
+    Save a finished job's solution to timetable.json, whether or not anyone polls for it
+    Saving the same job twice stores the same solution, so it is safe to call
+    from both the done callback and the status endpoint
+    """
+    if future.cancelled() or future.exception() is not None or future.result()['status'] != 'solved':
+        return
+    store.replace('timetable', future.result()['solution'])
+
+def _job_finished(job_id, future):
+    """
+    Done callback of a generation job: save its solution and start its expiry clock
+    """
+    _save_generated_timetable(future)
+    with _jobs_lock:
+        _finished_at[job_id] = time.monotonic()
+
+def _evict_finished_jobs():
+    """
+    Forget jobs that finished more than JOB_TTL seconds ago without being polled
+    """
+    cutoff = time.monotonic() - JOB_TTL
+    with _jobs_lock:
+        for job_id, finished in list(_finished_at.items()):
+            if finished < cutoff:
+                del _finished_at[job_id]
+                _jobs.pop(job_id, None)
+
 @app.route('/api/generate', methods=['POST'])
 def generate_timetable():
     """
-    Generate timetable using CSP solver
+    Start timetable generation using CSP solver in a background worker
     """
     try:
-        print("Starting timetable generation...")
+        logger.debug("Starting timetable generation...")
         
         # Load all required data
-        courses = load_json('courses.json')
-        teachers = load_json('teachers.json')
-        rooms = load_json('rooms.json')
-        timeslots = load_json('timeslots.json')
-        groups = load_json('groups.json')
+        courses = store.get('courses')
+        teachers = store.get('teachers')
+        rooms = store.get('rooms')
+        timeslots = store.get('timeslots')
+        groups = store.get('groups')
         
         # Validate that all required data exists
         if not courses:
@@ -303,38 +446,23 @@ def generate_timetable():
         if lab_courses and not lab_rooms:
             return jsonify({'success': False, 'message': 'No lab rooms available for lab courses. Please add lab rooms.'}), 400
         
-        print(f"Loaded data: {len(courses)} courses, {len(teachers)} teachers, {len(rooms)} rooms, {len(timeslots)} timeslots, {len(groups)} groups")
-        
-        # Create CSP solver instance
-        solver = TimetableSolver(courses, teachers, rooms, timeslots, groups)
+        logger.debug("Loaded data: %d courses, %d teachers, %d rooms, %d timeslots, %d groups",
+                     len(courses), len(teachers), len(rooms), len(timeslots), len(groups))
         
-        # Solve the timetable
-        solution = solver.solve()
-        
-        if solution is None:
-            return jsonify({
-                'success': False, 
-                'message': 'Could not generate timetable. No valid solution found. Try adjusting constraints or adding more resources.'
-            }), 400
-        
-        # Save solution to timetable.json
-        save_json('timetable.json', solution)
-        
-        # Get solution summary
-        summary = solver.get_solution_summary()
-        
-        # Format solution for display
-        formatted_solution = solver.format_solution(solution)
-        
-        print(f"Timetable generated successfully! {summary['total_assignments']} assignments created.")
+        # Hand the solve to a worker process and let the client poll for it
+        _evict_finished_jobs()
+        job_id = uuid.uuid4().hex
+        future = executor.submit(solve_timetable, courses, teachers, rooms, timeslots, groups)
+        with _jobs_lock:
+            _jobs[job_id] = future
+        future.add_done_callback(functools.partial(_job_finished, job_id))
         
         return jsonify({
             'success': True,
-            'message': 'Timetable generated successfully!',
-            'solution': solution,
-            'formatted_solution': formatted_solution,
-            'summary': summary
-        })
+            'message': 'Timetable generation started',
+            'job_id': job_id,
+            'status': 'running'
+        }), 202
         
     except Exception as e:
         print(f"Error generating timetable: {str(e)}")
@@ -343,6 +471,59 @@ def generate_timetable():
             'message': f'Error generating timetable: {str(e)}'
         }), 500
 
+@app.route('/api/generate/status/<job_id>', methods=['GET'])
+def generate_status(job_id):
+    """
+    Report whether a generation job is still running, or its result
+    """
+    future = _jobs.get(job_id)
+    if future is None:
+        return jsonify({'success': False, 'message': 'Generation job not found'}), 404
+    
+    if not future.done():
+        return jsonify({'success': True, 'job_id': job_id, 'status': 'running'})
+    
+    with _jobs_lock:
+        _jobs.pop(job_id, None)
+        _finished_at.pop(job_id, None)
+    try:
+        # done() turns true before the done callback runs, so save here too
+        # to have the timetable stored before reporting the job done
+        _save_generated_timetable(future)
+        result = future.result()
+    except Exception as e:
+        print(f"Error generating timetable: {str(e)}")
+        return jsonify({
+            'success': False,
+            'status': 'failed',
+            'message': f'Error generating timetable: {str(e)}'
+        }), 500
+    
+    if result['status'] == 'budget_exhausted':
+        return jsonify({
+            'success': False,
+            'status': 'budget_exhausted',
+            'message': f"Could not generate timetable. The search gave up after {result['steps']} steps without deciding; a solution may still exist. Try again or simplify the constraints."
+        }), 400
+    
+    if result['status'] != 'solved':
+        return jsonify({
+            'success': False,
+            'status': 'failed',
+            'message': 'Could not generate timetable. No valid solution found. Try adjusting constraints or adding more resources.'
+        }), 400
+    
+    logger.info("Timetable generated successfully! %d assignments created.", result['summary']['total_assignments'])
+    
+    return jsonify({
+        'success': True,
+        'status': 'done',
+        'message': 'Timetable generated successfully!',
+        'solution': result['solution'],
+        'formatted_solution': result['formatted_solution'],
+        'summary': result['summary']
+    })
+
 # Get Generated Timetable
 @app.route('/api/timetable', methods=['GET'])
 def get_timetable():
@@ -350,7 +531,7 @@ def get_timetable():
     Get the generated timetable data
     """
     try:
-        timetable = load_json('timetable.json')
+        timetable = store.get('timetable')
         return jsonify(timetable)
     except Exception as e:
         print(f"Error loading timetable: {str(e)}")
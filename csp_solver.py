@@ -1,19 +1,108 @@
 """
 Constraint Satisfaction Problem (CSP) Solver for Timetable Generation
-Uses backtracking algorithm to find valid timetable assignments
+Uses backtracking search with forward checking, MRV variable ordering and
+load-balancing value ordering to find valid timetable assignments
 """
 
+import hashlib
+import json
+import logging
+import queue
 import random
+from array import array
+from collections import OrderedDict, defaultdict, deque
+
+logger = logging.getLogger(__name__)
+
+# Shared default for index lookups that find nothing
+EMPTY_SET = frozenset()
+
+# Idle solvers reused across solves in this process (LIFO keeps the warmest on top)
+_solver_pool = queue.LifoQueue()
+
+# Solutions of recently solved instances in this process, keyed by a hash of
+# the inputs; the least recently used are dropped beyond SOLUTION_CACHE_SIZE
+SOLUTION_CACHE_SIZE = 32
+_solution_cache = OrderedDict()  # {input hash: (placement arrays, summary_distinct)}
+
+
+def clear_cache():
+    """
+    Drop every cached solution
+    """
+    _solution_cache.clear()
+
+
+def solve_timetable(courses, teachers, rooms, timeslots, groups):
+    """
+    Solve one timetable instance on a pooled solver
+    Module-level so it can be submitted to a worker process
+    
+    Returns:
+        Dictionary with the solver status ('solved', 'infeasible' or
+        'budget_exhausted') and the steps searched, plus solution,
+        formatted_solution and summary once solved
+    """
+    try:
+        solver = _solver_pool.get_nowait()
+        solver.configure(courses, teachers, rooms, timeslots, groups)
+    except queue.Empty:
+        solver = TimetableSolver(courses, teachers, rooms, timeslots, groups)
+    
+    try:
+        solution = solver.solve()
+        if solution is None:
+            return {'status': solver.status, 'steps': solver.steps}
+        return {
+            'status': solver.status,
+            'steps': solver.steps,
+            'solution': solution,
+            'formatted_solution': solver.format_solution(solution),
+            'summary': solver.get_solution_summary()
+        }
+    finally:
+        _solver_pool.put(solver)
+
 
 class TimetableSolver:
     """
     CSP Solver for generating conflict-free timetables
     """
     
-    def __init__(self, courses, teachers, rooms, timeslots, groups):
+    # Summary statistics, each counting distinct course codes, teacher
+    # names, room numbers and group names in that order
+    SUMMARY_STATS = ('courses_scheduled', 'teachers_used', 'rooms_used', 'groups_scheduled')
+    
+    def __init__(self, courses, teachers, rooms, timeslots, groups, max_steps=20000, random_seed=None):
         """
         Initialize the solver with all required data
         
+        Args:
+            courses: List of course dictionaries
+            teachers: List of teacher dictionaries  
+            rooms: List of room dictionaries
+            timeslots: List of timeslot dictionaries
+            groups: List of student group dictionaries
+            max_steps: Search step budget before giving up on the instance
+            random_seed: Seed for shuffling equally constrained courses and
+                groups; None keeps the order fully deterministic
+        """
+        self.max_steps = max_steps
+        self.random_seed = random_seed
+        
+        # Initialize empty solution list and tracking state
+        self.solution = []
+        self.course_teacher_map = {}
+        self.course_teacher_owner = {}
+        self.group_course_day_periods = defaultdict(set)
+        self.teacher_day_count = defaultdict(int)
+        
+        self.configure(courses, teachers, rooms, timeslots, groups)
+    
+    def configure(self, courses, teachers, rooms, timeslots, groups):
+        """
+        Load a problem instance so a pooled solver can be reused across requests
+        
         Args:
             courses: List of course dictionaries
             teachers: List of teacher dictionaries  
@@ -27,272 +116,841 @@ class TimetableSolver:
         self.timeslots = timeslots
         self.groups = groups
         
-        # Initialize empty solution list
+        # Index rooms by type once so domains never re-filter the room list
+        self.rooms_by_type = defaultdict(list)  # {room_type: [room_idx, ...]}
+        for room_idx, room in enumerate(rooms):
+            self.rooms_by_type[room['room_type']].append(room_idx)
+        
+        # Suitable rooms per course, resolved once rather than on every prune
+        self.course_rooms = [self.rooms_by_type.get(course['course_type'], ()) for course in courses]
+        
+        # Give every (day, period) its own bit in the occupancy masks below
+        self.slot_index = {(ts['day'], ts['period']): i for i, ts in enumerate(timeslots)}
+        self.slot_bits = [1 << self.slot_index[(ts['day'], ts['period'])] for ts in timeslots]
+        
+        # Structure-of-arrays views so the search loop works on list indices
+        # instead of string-keyed dictionary lookups
+        self.course_codes = [course['code'] for course in courses]
+        # Course types interned as small ints so the search compares ints
+        self.type_to_int = {room_type: i for i, room_type in enumerate(self.rooms_by_type)}
+        self.course_types = [self.type_to_int.setdefault(course['course_type'], len(self.type_to_int))
+                             for course in courses]
+        self.teacher_names = [teacher['name'] for teacher in teachers]
+        self.room_numbers = [room['room_number'] for room in rooms]
+        self.group_names = [group['name'] for group in groups]
+        self.slot_days = [ts['day'] for ts in timeslots]
+        self.slot_periods = [ts['period'] for ts in timeslots]
+        
+        # Per summary statistic, a dense id for each entity's name (entities
+        # sharing a name share an id), so the summary counts are list slots
+        self.summary_ids = []
+        for names in (self.course_codes, self.teacher_names, self.room_numbers, self.group_names):
+            name_ids = {}
+            self.summary_ids.append([name_ids.setdefault(name, len(name_ids)) for name in names])
+        
+        # Per slot: every slot on the same day, and those one period either side
+        slots_by_day = defaultdict(list)  # {day: [slot_idx, ...]}
+        for slot_idx, day in enumerate(self.slot_days):
+            slots_by_day[day].append(slot_idx)
+        self.day_slots = [slots_by_day[day] for day in self.slot_days]
+        self.days = list(slots_by_day)  # distinct days in timeslot order
+        self.slots_of_day = [slots_by_day[day] for day in self.days]
+        self.adjacent_slots = [[other for other in slots_by_day[self.slot_days[slot_idx]]
+                                if abs(self.slot_periods[other] - self.slot_periods[slot_idx]) == 1]
+                               for slot_idx in range(len(timeslots))]
+        
+        # Per-entity fragments of the assignment dict, merged once the search succeeds
+        self.course_parts = [{'course_code': course['code'],
+                              'course_name': course['name'],
+                              'course_type': course['course_type']} for course in courses]
+        self.room_parts = [{'room_number': room['room_number'],
+                            'room_type': room['room_type']} for room in rooms]
+        self.slot_parts = [{'day': ts['day'],
+                            'period': ts['period'],
+                            'start_time': ts['start_time'],
+                            'end_time': ts['end_time']} for ts in timeslots]
+        
+        self.reset()
+    
+    def reset(self):
+        """
+        Clear the solution and all tracking state before a new solve
+        """
+        # A fresh solution list, since callers may still hold the previous one
         self.solution = []
         
-        # Track assignments for constraint checking
-        self.teacher_assignments = {}  # {teacher_id: [(day, period), ...]}
-        self.room_assignments = {}    # {room_id: [(day, period), ...]}
-        self.group_assignments = {}    # {group_id: [(day, period), ...]}
+        # Solution grouped by day and period, filled in with self.solution
+        self.organized = {}  # {day: {period: [assignment, ...]}}
+        
+        # Placed sessions as parallel index arrays; the display dicts in
+        # self.solution are only built once the search succeeds
+        self.placed_courses = array('i')
+        self.placed_teachers = array('i')
+        self.placed_rooms = array('i')
+        self.placed_slots = array('i')
+        self.placed_groups = array('i')
+        
+        # Reference counts behind get_solution_summary; counts rather than
+        # sets so backtracking can take an assignment back out
+        self.summary_uses = [[0] * (max(ids) + 1 if ids else 0) for ids in self.summary_ids]
+        self.summary_distinct = [0] * len(self.SUMMARY_STATS)  # names with a nonzero count
+        
+        # Track assignments for constraint checking as occupied-slot bitmasks
+        self.teacher_mask = [0] * len(self.teachers)  # [mask per teacher_idx]
+        self.room_mask = [0] * len(self.rooms)        # [mask per room_idx]
+        self.group_mask = [0] * len(self.groups)      # [mask per group_idx]
+        
+        # Busy slots per group (the popcount of its mask), kept with the masks
+        self.group_load = [0] * len(self.groups)
         
         # CHANGE 1: Track which teacher teaches which course for variety
-        self.course_teacher_map = {}  # {course_code: teacher_id}
+        self.course_teacher_map.clear()  # {course_code: teacher_idx}
+        self.course_teacher_owner.clear()  # {course_code: index of the assignment that set the mapping}
         
         # CHANGE 2: Track course sessions per day to limit clustering
-        self.course_day_sessions = {}  # {(course_code, group_id, day): count}
+        self.group_course_day_periods.clear()  # {(group_idx, course_idx, day): {period, ...}}
+        
+        # Sessions per teacher per day, for the daily teaching limit
+        self.teacher_day_count.clear()  # {(teacher_idx, day): count}
+        
+        # Outcome of the last solve and the search steps it took
+        self.status = None  # 'solved', 'infeasible' or 'budget_exhausted'
+        self.steps = 0
     
     def solve(self):
         """
-        Main solving method using backtracking algorithm
+        Main solving method using backtracking search with forward checking
+        
+        Every (course, group, session) triple becomes a variable whose domain
+        holds all (teacher, room, timeslot) index tuples allowed by room type.
+        Variables are picked most-constrained first (MRV). Values try the
+        course's existing teacher first, then teachers with fewer courses and
+        a lighter load that day, then rooms and periods in list order. Every
+        placement prunes clashing values from the remaining domains so dead
+        ends surface early. On a dead end the search jumps straight back to
+        the latest placement involved in the conflict (conflict-directed
+        backjumping).
+        
+        self.status tells the two failures apart: 'infeasible' once the
+        instance is proven to have no solution, 'budget_exhausted' when the
+        search gave up after max_steps steps without deciding either way.
         
         Returns:
             List of assignments if solution found, None if no solution
         """
-        print("Starting CSP solver...")
+        logger.debug("Starting CSP solver...")
+        
+        # Start from a clean slate, so solving twice never stacks a second
+        # solution onto the first
+        self.reset()
+        
+        cache_key = self._cache_key()
+        cached = _solution_cache.get(cache_key)
+        if cached is not None:
+            _solution_cache.move_to_end(cache_key)
+            self._load_cached(cached)
+            self.status = 'solved'
+            logger.info("Solution found in cache! Total assignments: %d", len(self.solution))
+            return self.solution
+        
+        self._build_variables()
+        logger.debug("Built %d session variables", len(self.variables))
+        
+        self.status = 'infeasible'
+        if not self._has_capacity():
+            logger.info("No solution possible: more sessions than the resources can hold")
+            return None
+        
+        if not self._propagate_ac3():
+            logger.info("No solution possible: arc consistency emptied a session domain")
+            return None
+        
+        if self._backtrack() is not None:
+            if self.steps > self.max_steps:
+                self.status = 'budget_exhausted'
+                logger.info("Search budget of %d steps exhausted without a solution", self.max_steps)
+            else:
+                logger.info("No solution exists: search exhausted after %d steps", self.steps)
+            return None
+        
+        self._materialize()
+        self.status = 'solved'
+        logger.info("Solution found! Total assignments: %d (%d search steps)", len(self.solution), self.steps)
+        
+        _solution_cache[cache_key] = (
+            (self.placed_courses, self.placed_teachers, self.placed_rooms,
+             self.placed_slots, self.placed_groups),
+            list(self.summary_distinct)
+        )
+        while len(_solution_cache) > SOLUTION_CACHE_SIZE:
+            _solution_cache.popitem(last=False)
+        return self.solution
+    
+    def _cache_key(self):
+        """
+        Hash the problem instance for the solution cache
         
-        # Shuffle courses and groups to encourage mixing
-        courses = self.courses[:]
-        groups = self.groups[:]
-        random.shuffle(courses)
-        random.shuffle(groups)
+        Record order is kept, since placements refer to records by position.
+        """
+        inputs = [self.courses, self.teachers, self.rooms, self.timeslots, self.groups, self.random_seed]
+        encoded = json.dumps(inputs, sort_keys=True, default=str).encode('utf-8')
+        return hashlib.blake2b(encoded, digest_size=16).hexdigest()
+    
+    def _load_cached(self, cached):
+        """
+        Rebuild a cached solution as fresh assignment dicts
+        """
+        placements, summary_distinct = cached
+        (self.placed_courses, self.placed_teachers, self.placed_rooms,
+         self.placed_slots, self.placed_groups) = (array('i', column) for column in placements)
+        self.summary_distinct = list(summary_distinct)
+        self._materialize()
+    
+    def _build_variables(self):
+        """
+        Create one variable per (course, group, session) with its initial domain
+        """
+        course_order = list(range(len(self.courses)))
+        group_order = list(range(len(self.groups)))
+        if self.random_seed is not None:
+            rng = random.Random(self.random_seed)
+            rng.shuffle(course_order)
+            rng.shuffle(group_order)
+        
+        # Most constrained first: courses with the most sessions, then those
+        # with the fewest suitable rooms. The sort is stable, so a seeded
+        # shuffle only reorders ties. Every group takes every course, so
+        # groups are equally loaded and keep their order
+        sessions_per_week = [course['sessions_per_week'] for course in self.courses]
+        course_order.sort(key=lambda c: (-sessions_per_week[c], len(self.course_rooms[c])))
+        
+        slot_range = range(len(self.timeslots))
+        teacher_range = range(len(self.teachers))
+        
+        course_values = {}  # {course_idx: every (teacher, room, slot) allowed by room type}
+        for course_idx in course_order:
+            room_indices = self.course_rooms[course_idx]
+            course_values[course_idx] = {(t, r, s) for t in teacher_range for r in room_indices for s in slot_range}
+        
+        # Interleave sessions (every course's first session, then every second
+        # one, ...) rather than filling one course at a time, with courses that
+        # need the most sessions first within each round
+        self.variables = [(course_idx, group_idx, session)
+                          for course_idx in course_order
+                          for group_idx in group_order
+                          for session in range(sessions_per_week[course_idx])]
+        self.variables.sort(key=lambda v: (v[2], -sessions_per_week[v[0]]))
+        self.domains = [set(course_values[course_idx]) for course_idx, _, _ in self.variables]
+        
+        self.unassigned = set(range(len(self.variables)))
+        self.trail = []
+        self.pruned_by = [[] for _ in self.variables]  # [depths that pruned each variable]
+        self.steps = 0
+    
+    def _has_capacity(self):
+        """
+        Check that the resources can hold every session at all
         
-        for course in courses:
-            print(f"Processing course: {course['code']} - {course['name']}")
-            
-            # For each student group
-            for group in groups:
-                print(f"  Scheduling for group: {group['name']}")
-                
-                # Schedule required number of sessions per week
-                sessions_needed = course['sessions_per_week']
-                sessions_scheduled = 0
-                
-                for session in range(sessions_needed):
-                    print(f"    Scheduling session {session + 1}/{sessions_needed}")
-                    
-                    # Try to assign this session
-                    if not self.assign_session(course, group):
-                        print(f"    Failed to schedule session {session + 1} for {course['code']} - {group['name']}")
-                        return None  # No solution possible
-                    
-                    sessions_scheduled += 1
-                    print(f"    Successfully scheduled session {session + 1}")
+        Counts sessions against the most each resource could take in a week:
+        rooms of each type, every group's timeslots, the teachers' daily
+        limits, and each course's two non-adjacent sessions per group per day.
+        Failing any count proves the instance infeasible without searching.
         
-        print(f"Solution found! Total assignments: {len(self.solution)}")
-        return self.solution
+        Returns:
+            True if every count fits, False otherwise
+        """
+        day_periods = [len(slots) for slots in self.slots_of_day]
+        sessions_per_week = [course['sessions_per_week'] for course in self.courses]
+        group_count = len(self.groups)
+        
+        type_sessions = defaultdict(int)  # {course type: sessions needing that room type}
+        for course_idx, sessions in enumerate(sessions_per_week):
+            type_sessions[self.course_types[course_idx]] += sessions * group_count
+        for course_idx, sessions in enumerate(sessions_per_week):
+            course_type = self.course_types[course_idx]
+            if type_sessions[course_type] > len(self.course_rooms[course_idx]) * len(self.timeslots):
+                return False
+        
+        if sum(sessions_per_week) > len(self.timeslots):
+            return False
+        
+        teacher_week = sum(min(6, periods) for periods in day_periods)
+        if sum(sessions_per_week) * group_count > len(self.teachers) * teacher_week:
+            return False
+        
+        course_week = sum(self._course_day_capacity(slots) for slots in self.slots_of_day)
+        return max(sessions_per_week, default=0) <= course_week
     
-    def assign_session(self, course, group):
+    def _course_day_capacity(self, slots):
         """
-        Try to assign one session for given course and group
+        Count the sessions one course can give one group on a day
+        
+        Days may skip periods, so this counts non-adjacent periods greedily
+        from the earliest rather than assuming the periods are contiguous.
         
         Args:
-            course: Course dictionary
-            group: Student group dictionary
+            slots: Slot indices of the day
+            
+        Returns:
+            Number of sessions that fit, at most 2
+        """
+        count = 0
+        last_period = None
+        for period in sorted({self.slot_periods[slot_idx] for slot_idx in slots}):
+            if last_period is None or period - last_period > 1:
+                count += 1
+                last_period = period
+                if count == 2:
+                    break
+        return count
+    
+    def _propagate_ac3(self):
+        """
+        Make the initial domains arc consistent before searching (AC-3)
+        
+        Two sessions constrain each other when their values share a timeslot
+        and a teacher, room or group, or when they are sessions of the same
+        course for the same group on adjacent periods. A value is dropped when
+        the other session has no value left that it is compatible with.
+        
+        Returns:
+            False if some variable is left without values, True otherwise
+        """
+        count = len(self.variables)
+        if any(not domain for domain in self.domains):
+            return False
+        
+        # Distinct (day, period) bits per domain; a value can only clash with
+        # three of them (its own slot and the two adjacent periods), so a
+        # domain spanning four or more always offers support
+        widths = [self._slot_width(domain) for domain in self.domains]
+        
+        # Only arcs towards narrow domains can revise anything; an arc is
+        # queued again whenever the domain it points to shrinks
+        arcs = deque((x, y) for y in range(count) if widths[y] <= 3 for x in range(count) if x != y)
+        queued = set(arcs)
+        
+        while arcs:
+            x, y = arcs.popleft()
+            queued.discard((x, y))
+            if widths[y] > 3 or not self._revise(x, y):
+                continue
             
+            if not self.domains[x]:
+                return False
+            widths[x] = self._slot_width(self.domains[x])
+            if widths[x] > 3:
+                continue
+            for z in range(count):
+                if z != x and z != y and (z, x) not in queued:
+                    arcs.append((z, x))
+                    queued.add((z, x))
+        
+        return True
+    
+    def _slot_width(self, domain):
+        """
+        Count the distinct (day, period) slots used by a domain's values
+        """
+        slot_bits = self.slot_bits
+        span = 0
+        for value in domain:
+            span |= slot_bits[value[2]]
+        return bin(span).count('1')
+    
+    def _revise(self, x, y):
+        """
+        Remove values of variable x that no value of variable y is compatible with
+        
+        Returns:
+            True if the domain of x changed, False otherwise
+        """
+        course_x, group_x, _ = self.variables[x]
+        course_y, group_y, _ = self.variables[y]
+        same_group = group_x == group_y
+        same_course = same_group and course_x == course_y
+        slot_bits = self.slot_bits
+        slot_days = self.slot_days
+        slot_periods = self.slot_periods
+        
+        def compatible(v, w):
+            if slot_bits[v[2]] == slot_bits[w[2]]:
+                return not same_group and v[0] != w[0] and v[1] != w[1]
+            return not (same_course and slot_days[v[2]] == slot_days[w[2]] and
+                        abs(slot_periods[v[2]] - slot_periods[w[2]]) == 1)
+        
+        domain_y = self.domains[y]
+        removed = [v for v in self.domains[x] if not any(compatible(v, w) for w in domain_y)]
+        if not removed:
+            return False
+        
+        self.domains[x].difference_update(removed)
+        return True
+    
+    def _backtrack(self):
+        """
+        Assign every variable, backjumping on dead ends
+        
+        The search keeps an explicit stack of frames, one per variable being
+        placed, rather than recursing, so instances with thousands of sessions
+        stay clear of Python's recursion limit. A frame's depth is its
+        position in the stack.
+        
         Returns:
-            True if assignment successful, False otherwise
+            None if every variable was assigned, otherwise the conflict set of
+            the failure: depths of the placements that caused it
+        """
+        group_load = self.group_load
+        variables = self.variables
+        domains = self.domains
+        
+        # [var, conflicts, value iterator, placed value, trail mark] per depth
+        stack = []
+        # Conflict set of the latest failure, handed to the frame on top;
+        # None while the search is moving forward
+        failure = None
+        
+        while True:
+            if failure is None:
+                depth = len(stack)
+                if depth == len(variables):
+                    return None
+                
+                self.steps += 1
+                if self.steps > self.max_steps:
+                    failure = set()
+                else:
+                    # MRV: the variable with the fewest remaining values fails
+                    # first; ties go to the group with the fewest free timeslots left
+                    var = min(self.unassigned,
+                              key=lambda v: (len(domains[v]), -group_load[variables[v][1]], v))
+                    self.unassigned.discard(var)
+                    
+                    # Earlier placements that ruled out values of this variable
+                    conflicts = set(self.pruned_by[var])
+                    stack.append([var, conflicts, self._feasible_values(var, conflicts), None, 0])
+            
+            if not stack:
+                return failure
+            
+            frame = stack[-1]
+            depth = len(stack) - 1
+            var, conflicts, values, value, mark = frame
+            course_idx, group_idx, _ = variables[var]
+            
+            if failure is not None:
+                # The placement on top led to the failure: take it back
+                teacher_idx, room_idx, slot_idx = value
+                self._restore(mark)
+                self._unassign(course_idx, teacher_idx, room_idx, slot_idx, group_idx)
+                
+                if depth not in failure or self.steps > self.max_steps:
+                    # This variable played no part in the failure (or the budget
+                    # ran out), so no other value of it can help: jump further back
+                    if self.steps > self.max_steps:
+                        failure = set()
+                    self.unassigned.add(var)
+                    stack.pop()
+                    continue
+                failure.discard(depth)
+                conflicts |= failure
+                failure = None
+            
+            value = next(values, None)
+            if value is None:
+                # Every value failed: hand what ruled them out further back
+                self.unassigned.add(var)
+                stack.pop()
+                failure = conflicts
+                continue
+            
+            teacher_idx, room_idx, slot_idx = value
+            frame[3] = value
+            frame[4] = len(self.trail)
+            self._assign(course_idx, teacher_idx, room_idx, slot_idx, group_idx)
+            
+            wiped = self._forward_check(var, value, depth)
+            if wiped is not None:
+                # The emptied domain was pruned by this placement and earlier ones
+                failure = set(self.pruned_by[wiped])
+    
+    def _feasible_values(self, var, conflicts):
         """
-        course_code = course['code']
+        Lazily yield the domain values of a variable that fit the current timetable
         
-        # CHANGE 3: If course already has assigned teacher, prefer that teacher
-        # This ensures same teacher for all sessions of a course
-        preferred_teacher_id = self.course_teacher_map.get(course_code)
+        Values are checked one at a time as the search asks for them, so a
+        branch that succeeds on its first value never tests the rest. Each
+        yielded value is undone before the next is requested, which keeps the
+        masks the generator reads consistent between yields.
         
-        teachers = self.teachers[:]
+        Args:
+            var: Index of the variable being assigned
+            conflicts: Set that collects the depths of placements ruling out values
+            
+        Yields:
+            (teacher_idx, room_idx, slot_idx) tuples in search order
+        """
+        course_idx, group_idx, _ = self.variables[var]
+        slot_bits = self.slot_bits
+        group_mask = self.group_mask
         
-        # CHANGE 4: Sort teachers - put preferred teacher first if exists
-        if preferred_teacher_id:
-            teachers.sort(key=lambda t: 0 if t['id'] == preferred_teacher_id else 1)
-        else:
-            random.shuffle(teachers)  # Randomize for first session
+        # Group-level checks depend only on the timeslot, so one failure rules
+        # out every teacher and room at that slot without re-testing them
+        rejected_slots = set()
         
-        for teacher in teachers:
-            # CHANGE 5: Skip if trying different teacher when one is already assigned
-            # (unless preferred teacher is fully booked)
-            if preferred_teacher_id and teacher['id'] != preferred_teacher_id:
-                # Only try other teachers if preferred is not available
+        for value in self._order_domain_values(var):
+            teacher_idx, room_idx, slot_idx = value
+            if slot_idx in rejected_slots:
                 continue
             
-            # Get rooms that match the course type
-            valid_rooms = self.get_rooms_for_course(course, self.rooms)
+            if (group_mask[group_idx] & slot_bits[slot_idx] or
+                    not self._course_fits_day(course_idx, group_idx, slot_idx)):
+                rejected_slots.add(slot_idx)
+                conflicts.update(self._culprits(course_idx, group_idx, -1, -1, slot_idx))
+                continue
             
-            for room in valid_rooms:
-                for timeslot in self.timeslots:
-                    # Check if this assignment is valid
-                    if self.is_valid(course, teacher, room, timeslot, group):
-                        # CHANGE 6: Record teacher-course mapping on first assignment
-                        if course_code not in self.course_teacher_map:
-                            self.course_teacher_map[course_code] = teacher['id']
-                        
-                        # Create assignment
-                        assignment = {
-                            'course_code': course['code'],
-                            'course_name': course['name'],
-                            'teacher_name': teacher['name'],
-                            'room_number': room['room_number'],
-                            'day': timeslot['day'],
-                            'period': timeslot['period'],
-                            'start_time': timeslot['start_time'],
-                            'end_time': timeslot['end_time'],
-                            'group_name': group['name'],
-                            'course_type': course['course_type'],
-                            'room_type': room['room_type']
-                        }
-                        
-                        # Add to solution
-                        self.solution.append(assignment)
-                        
-                        # Update tracking dictionaries
-                        self._update_assignments(teacher['id'], room['id'], group['id'], 
-                                               timeslot['day'], timeslot['period'],
-                                               course_code, group['id'])  # CHANGE 7: Pass course info
-                        
-                        return True
-        
-        # CHANGE 8: If preferred teacher didn't work, try ANY teacher
-        if preferred_teacher_id:
-            random.shuffle(teachers)
-            for teacher in teachers:
-                valid_rooms = self.get_rooms_for_course(course, self.rooms)
-                for room in valid_rooms:
-                    for timeslot in self.timeslots:
-                        if self.is_valid(course, teacher, room, timeslot, group):
-                            assignment = {
-                                'course_code': course['code'],
-                                'course_name': course['name'],
-                                'teacher_name': teacher['name'],
-                                'room_number': room['room_number'],
-                                'day': timeslot['day'],
-                                'period': timeslot['period'],
-                                'start_time': timeslot['start_time'],
-                                'end_time': timeslot['end_time'],
-                                'group_name': group['name'],
-                                'course_type': course['course_type'],
-                                'room_type': room['room_type']
-                            }
-                            self.solution.append(assignment)
-                            self._update_assignments(teacher['id'], room['id'], group['id'], 
-                                                   timeslot['day'], timeslot['period'],
-                                                   course_code, group['id'])
-                            return True
-        
-        return False  # No valid assignment found
-    
-    def is_valid(self, course, teacher, room, timeslot, group):
-        """
-        Check if assignment satisfies all hard constraints
+            if (self.is_valid(teacher_idx, room_idx, group_idx, slot_bits[slot_idx]) and
+                    self._teacher_fits_day(teacher_idx, slot_idx)):
+                yield value
+            else:
+                conflicts.update(self._culprits(course_idx, group_idx, teacher_idx, room_idx, slot_idx))
+    
+    def _culprits(self, course_idx, group_idx, teacher_idx, room_idx, slot_idx):
+        """
+        Find the placements that could rule out a value for a session
+        
+        Forward checking removes most clashing values before they are tried,
+        so this only runs for the few rejected during selection. It may name
+        more placements than strictly needed, which is safe for backjumping.
+        Pass -1 for teacher_idx and room_idx to check the group alone.
+        
+        Returns:
+            Set of depths of the placements sharing the slot or day with the value
+        """
+        slot_bits = self.slot_bits
+        slot_days = self.slot_days
+        bit = slot_bits[slot_idx]
+        day = slot_days[slot_idx]
+        
+        culprits = set()
+        placements = zip(self.placed_courses, self.placed_teachers, self.placed_rooms,
+                         self.placed_slots, self.placed_groups)
+        for depth, (c, t, r, s, g) in enumerate(placements):
+            if slot_bits[s] == bit and (g == group_idx or t == teacher_idx or r == room_idx):
+                culprits.add(depth)
+            elif slot_days[s] == day and (t == teacher_idx or (c == course_idx and g == group_idx)):
+                culprits.add(depth)
+        return culprits
+    
+    def _order_domain_values(self, var):
+        """
+        Lazily yield the domain values of a variable, lightest teacher load first
+        
+        The course's existing teacher is tried before any other teacher so all
+        sessions of a course stay with the same teacher whenever possible;
+        otherwise teachers with fewer courses come first to spread the load.
+        Among equally ranked teachers, the (teacher, day) pairs with the
+        lightest teaching load go first, so no teacher is pushed towards the
+        daily limit while others sit idle; rooms and periods then follow in
+        list order. Candidates are generated in that order and checked against
+        the domain, so the domain is never sorted as a whole and a search step
+        that succeeds on an early value stops generating there.
         
         Args:
-            course: Course dictionary
-            teacher: Teacher dictionary
-            room: Room dictionary
-            timeslot: Timeslot dictionary
-            group: Student group dictionary
+            var: Index of the variable being assigned
+            
+        Yields:
+            (teacher_idx, room_idx, slot_idx) tuples in the domain
+        """
+        course_idx, _, _ = self.variables[var]
+        domain = self.domains[var]
+        room_indices = self.course_rooms[course_idx]
+        slots_of_day = self.slots_of_day
+        teacher_day_count = self.teacher_day_count
+        
+        preferred_teacher_idx = self.course_teacher_map.get(self.course_codes[course_idx])
+        courses_taught = [0] * len(self.teachers)
+        for teacher_idx in self.course_teacher_map.values():
+            courses_taught[teacher_idx] += 1
+        
+        ranks = defaultdict(list)  # {(not preferred, courses taught): [teacher_idx, ...]}
+        for teacher_idx in range(len(self.teachers)):
+            ranks[(teacher_idx != preferred_teacher_idx, courses_taught[teacher_idx])].append(teacher_idx)
+        
+        for rank in sorted(ranks):
+            teacher_days = sorted((teacher_day_count.get((teacher_idx, day), 0), teacher_idx, day_order, day)
+                                  for teacher_idx in ranks[rank]
+                                  for day_order, day in enumerate(self.days))
+            for _, teacher_idx, day_order, _ in teacher_days:
+                for room_idx in room_indices:
+                    for slot_idx in slots_of_day[day_order]:
+                        value = (teacher_idx, room_idx, slot_idx)
+                        if value in domain:
+                            yield value
+    
+    def _forward_check(self, var, value, depth):
+        """
+        Prune values that clash with a new assignment from unassigned variables
+        
+        Args:
+            var: Index of the variable just assigned
+            value: (teacher_idx, room_idx, slot_idx) tuple it was assigned
+            depth: Search depth of the assignment, recorded against each pruning
             
         Returns:
-            True if all constraints satisfied, False otherwise
+            The unassigned variable left with no values, or None if there is none
         """
-        day = timeslot['day']
-        period = timeslot['period']
-        teacher_id = teacher['id']
-        room_id = room['id']
-        group_id = group['id']
-        course_code = course['code']
-        
-        # Constraint 1: No Teacher Conflict
-        # Check if teacher already has class at this day and period
-        if teacher_id in self.teacher_assignments:
-            if (day, period) in self.teacher_assignments[teacher_id]:
-                return False
+        teacher_idx, room_idx, slot_idx = value
+        course_idx, group_idx, _ = self.variables[var]
+        variables = self.variables
+        domains = self.domains
+        course_types = self.course_types
+        course_type = course_types[course_idx]
+        teacher_range = range(len(self.teachers))
+        
+        # What a session loses depends only on whether it shares the group
+        # (and course) and on its room type, so each set is built once per call
+        lost_values = {}
+        
+        def lost_by(other_course_idx, other_group_idx):
+            other_type = course_types[other_course_idx]
+            if other_group_idx != group_idx:
+                key = ('other group', other_type)
+            elif other_course_idx != course_idx:
+                key = ('same group', other_type)
+            else:
+                key = ('same course', other_type)
+            values = lost_values.get(key)
+            if values is not None:
+                return values
+            
+            room_indices = self.course_rooms[other_course_idx]
+            if other_group_idx != group_idx:
+                # Another group loses this teacher at this time, and this
+                # room too if it could use it
+                values = {(teacher_idx, r, slot_idx) for r in room_indices}
+                if other_type == course_type:
+                    values.update((t, room_idx, slot_idx) for t in teacher_range)
+            else:
+                # Same group: the whole timeslot is gone; for the same course
+                # also the adjacent periods, and the whole day once it holds
+                # the maximum two sessions
+                lost_slots = [slot_idx]
+                if other_course_idx == course_idx:
+                    day_key = (group_idx, course_idx, self.slot_days[slot_idx])
+                    if len(self.group_course_day_periods[day_key]) >= 2:
+                        lost_slots = self.day_slots[slot_idx]
+                    else:
+                        lost_slots = lost_slots + self.adjacent_slots[slot_idx]
+                values = {(t, r, s) for s in lost_slots for t in teacher_range for r in room_indices}
+            lost_values[key] = values
+            return values
+        
+        for other in self.unassigned:
+            other_course_idx, other_group_idx, _ = variables[other]
+            domain = domains[other]
+            removed = domain.intersection(lost_by(other_course_idx, other_group_idx))
+            if removed:
+                domain.difference_update(removed)
+                self.trail.append((other, removed))
+                self.pruned_by[other].append(depth)
+                if not domain:
+                    return other
+        
+        return None
+    
+    def _restore(self, mark):
+        """
+        Undo forward-checking prunings recorded after the given trail position
+        """
+        while len(self.trail) > mark:
+            other, removed = self.trail.pop()
+            self.pruned_by[other].pop()
+            self.domains[other].update(removed)
+    
+    def _assign(self, course_idx, teacher_idx, room_idx, slot_idx, group_idx):
+        """
+        Record an assignment in the compact solution and tracking dictionaries
+        """
+        course_code = self.course_codes[course_idx]
         
-        # Constraint 2: No Room Conflict  
-        # Check if room already occupied at this day and period
-        if room_id in self.room_assignments:
-            if (day, period) in self.room_assignments[room_id]:
-                return False
+        # Record teacher-course mapping on first assignment
+        if course_code not in self.course_teacher_map:
+            self.course_teacher_map[course_code] = teacher_idx
+            self.course_teacher_owner[course_code] = len(self.placed_courses)
         
-        # Constraint 3: No Student Group Conflict
-        # Check if group already has class at this day and period
-        if group_id in self.group_assignments:
-            if (day, period) in self.group_assignments[group_id]:
-                return False
+        self.placed_courses.append(course_idx)
+        self.placed_teachers.append(teacher_idx)
+        self.placed_rooms.append(room_idx)
+        self.placed_slots.append(slot_idx)
+        self.placed_groups.append(group_idx)
+        self._count_names(course_idx, teacher_idx, room_idx, group_idx)
         
-        # Constraint 4: Room Type Matching
-        # Lab courses need Lab rooms, Theory courses need Theory rooms
-        if course['course_type'] != room['room_type']:
-            return False
+        self._update_assignments(teacher_idx, room_idx, group_idx, slot_idx, course_idx)
+    
+    def _unassign(self, course_idx, teacher_idx, room_idx, slot_idx, group_idx):
+        """
+        Reverse the most recent _assign call
+        """
+        course_code = self.course_codes[course_idx]
+        self.placed_courses.pop()
+        self.placed_teachers.pop()
+        self.placed_rooms.pop()
+        self.placed_slots.pop()
+        self.placed_groups.pop()
+        self._count_names(course_idx, teacher_idx, room_idx, group_idx, -1)
+        
+        day = self.slot_days[slot_idx]
+        period = self.slot_periods[slot_idx]
+        
+        if self.course_teacher_owner.get(course_code) == len(self.placed_courses):
+            del self.course_teacher_map[course_code]
+            del self.course_teacher_owner[course_code]
+        
+        bit = self.slot_bits[slot_idx]
+        self.teacher_mask[teacher_idx] ^= bit
+        self.room_mask[room_idx] ^= bit
+        self.group_mask[group_idx] ^= bit
+        self.group_load[group_idx] -= 1
+        self.group_course_day_periods[(group_idx, course_idx, day)].discard(period)
+        self.teacher_day_count[(teacher_idx, day)] -= 1
+    
+    def _count_names(self, course_idx, teacher_idx, room_idx, group_idx, sign=1):
+        """
+        Add (or with sign=-1 remove) one placement to the summary counts
+        """
+        placed = (course_idx, teacher_idx, room_idx, group_idx)
+        for stat, (ids, idx) in enumerate(zip(self.summary_ids, placed)):
+            uses = self.summary_uses[stat]
+            name_id = ids[idx]
+            uses[name_id] += sign
+            # A name starts counting on its first use and stops after its last
+            if uses[name_id] == (sign > 0):
+                self.summary_distinct[stat] += sign
+    
+    def _materialize(self):
+        """
+        Build the assignment dicts of the placed sessions in placement order,
+        then group them by day and period
+        """
+        course_parts = self.course_parts
+        room_parts = self.room_parts
+        slot_parts = self.slot_parts
+        teacher_names = self.teacher_names
+        group_names = self.group_names
+        
+        for course_idx, teacher_idx, room_idx, slot_idx, group_idx in zip(
+                self.placed_courses, self.placed_teachers, self.placed_rooms,
+                self.placed_slots, self.placed_groups):
+            assignment = {
+                **course_parts[course_idx],
+                'teacher_name': teacher_names[teacher_idx],
+                **room_parts[room_idx],
+                **slot_parts[slot_idx],
+                'group_name': group_names[group_idx]
+            }
+            self.solution.append(assignment)
+        self.organized = self._organize(self.solution)
+    
+    @staticmethod
+    def _organize(solution):
+        """
+        Group assignments by day and then by period, keeping their order
+        """
+        organized = {}
+        for assignment in solution:
+            organized.setdefault(assignment['day'], {}).setdefault(assignment['period'], []).append(assignment)
+        return organized
+    
+    def is_valid(self, teacher_idx, room_idx, group_idx, slot_bit):
+        """
+        Check that teacher, room and group are all free in a timeslot
+        
+        Room type matching needs no check here: domains are built from
+        rooms_by_type, so every candidate room already suits its course.
+        
+        Args:
+            teacher_idx: Index of the candidate teacher
+            room_idx: Index of the candidate room
+            group_idx: Index of the student group
+            slot_bit: Occupancy mask bit of the candidate timeslot
+            
+        Returns:
+            True if nobody involved is busy at that time, False otherwise
+        """
+        # Constraints 1-3: No Teacher, Room or Student Group Conflict
+        return not (self.teacher_mask[teacher_idx] | self.room_mask[room_idx] | self.group_mask[group_idx]) & slot_bit
+    
+    def _course_fits_day(self, course_idx, group_idx, slot_idx):
+        """
+        Check the per-day spreading constraints of a course for one group
+        
+        Args:
+            course_idx: Index of the course
+            group_idx: Index of the student group
+            slot_idx: Index of the candidate timeslot
+            
+        Returns:
+            True if all constraints satisfied, False otherwise
+        """
+        day = self.slot_days[slot_idx]
+        period = self.slot_periods[slot_idx]
+        periods_today = self.group_course_day_periods.get((group_idx, course_idx, day), EMPTY_SET)
         
         # CHANGE 9: IMPROVED Constraint 5 - Prevent same course in consecutive periods
         # Only checks for immediate adjacency (period-1 or period+1)
-        for assignment in self.solution:
-            if (assignment['group_name'] == group['name'] and 
-                assignment['day'] == day and 
-                assignment['course_code'] == course_code):
-                if abs(assignment['period'] - period) == 1:  # Adjacent periods
-                    return False
+        if period - 1 in periods_today or period + 1 in periods_today:
+            return False
         
         # CHANGE 10: RELAXED Constraint 6 - Limit course sessions per day
-        # Allow max 2 sessions of same course on same day (was unlimited before)
-        course_day_key = (course_code, group_id, day)
-        sessions_today = self.course_day_sessions.get(course_day_key, 0)
-        if sessions_today >= 2:  # Max 2 sessions per course per day
+        # Allow max 2 sessions of same course on same day (was unlimited before);
+        # the group is busy in each period it has, so every session is one period
+        if len(periods_today) >= 2:  # Max 2 sessions per course per day
             return False
         
+        return True
+    
+    def _teacher_fits_day(self, teacher_idx, slot_idx):
+        """
+        Check the daily session limit of a teacher
+        
+        Args:
+            teacher_idx: Index of the candidate teacher
+            slot_idx: Index of the candidate timeslot
+            
+        Returns:
+            True if the teacher can take another session that day, False otherwise
+        """
         # CHANGE 11: RELAXED Constraint 7 - Teacher session limit per day
         # Increased from 4 to 6 sessions per day for flexibility
-        teacher_sessions_today = [a for a in self.solution 
-                                 if a['teacher_name'] == teacher['name'] and a['day'] == day]
-        if len(teacher_sessions_today) >= 6:  # Increased limit
+        teacher_sessions_today = self.teacher_day_count.get((teacher_idx, self.slot_days[slot_idx]), 0)
+        if teacher_sessions_today >= 6:  # Increased limit
             return False
         
-        # All constraints satisfied
         return True
     
-    def _update_assignments(self, teacher_id, room_id, group_id, day, period, course_code=None, group_id_for_course=None):
+    def _update_assignments(self, teacher_idx, room_idx, group_idx, slot_idx, course_idx):
         """
         Update tracking dictionaries after successful assignment
         
         Args:
-            teacher_id: ID of assigned teacher
-            room_id: ID of assigned room
-            group_id: ID of assigned group
-            day: Day of assignment
-            period: Period of assignment
-            course_code: Course code (CHANGE 12: Added parameter)
-            group_id_for_course: Group ID for course tracking (CHANGE 13: Added parameter)
-        """
-        # Update teacher assignments
-        if teacher_id not in self.teacher_assignments:
-            self.teacher_assignments[teacher_id] = []
-        self.teacher_assignments[teacher_id].append((day, period))
-        
-        # Update room assignments
-        if room_id not in self.room_assignments:
-            self.room_assignments[room_id] = []
-        self.room_assignments[room_id].append((day, period))
-        
-        # Update group assignments
-        if group_id not in self.group_assignments:
-            self.group_assignments[group_id] = []
-        self.group_assignments[group_id].append((day, period))
-        
-        # CHANGE 14: Track course sessions per day
-        if course_code and group_id_for_course:
-            course_day_key = (course_code, group_id_for_course, day)
-            self.course_day_sessions[course_day_key] = self.course_day_sessions.get(course_day_key, 0) + 1
-    
-    def get_rooms_for_course(self, course, rooms):
+            teacher_idx: Index of assigned teacher
+            room_idx: Index of assigned room
+            group_idx: Index of assigned group
+            slot_idx: Index of assigned timeslot
+            course_idx: Index of assigned course
         """
-        Filter rooms based on course type
+        # Mark the slot busy for teacher, room and group
+        bit = self.slot_bits[slot_idx]
+        self.teacher_mask[teacher_idx] |= bit
+        self.room_mask[room_idx] |= bit
+        self.group_mask[group_idx] |= bit
+        self.group_load[group_idx] += 1
         
-        Args:
-            course: Course dictionary
-            rooms: List of all rooms
-            
-        Returns:
-            List of rooms matching course type
-        """
-        return [room for room in rooms if room['room_type'] == course['course_type']]
+        # CHANGE 14: Track course sessions per day
+        day = self.slot_days[slot_idx]
+        self.group_course_day_periods[(group_idx, course_idx, day)].add(self.slot_periods[slot_idx])
+        self.teacher_day_count[(teacher_idx, day)] += 1
     
     def format_solution(self, solution):
         """
@@ -307,24 +965,11 @@ class TimetableSolver:
         if not solution:
             return {}
         
-        # Group assignments by day
-        organized = {}
-        for assignment in solution:
-            day = assignment['day']
-            if day not in organized:
-                organized[day] = {}
-            
-            period = assignment['period']
-            if period not in organized[day]:
-                organized[day][period] = []
-            
-            organized[day][period].append(assignment)
+        # The solver's own solution was grouped as it was built
+        organized = self.organized if solution is self.solution else self._organize(solution)
         
         # Sort by period within each day
-        for day in organized:
-            organized[day] = dict(sorted(organized[day].items()))
-        
-        return organized
+        return {day: dict(sorted(periods.items())) for day, periods in organized.items()}
     
     def get_solution_summary(self):
         """
@@ -333,27 +978,9 @@ class TimetableSolver:
         Returns:
             Dictionary with solution statistics
         """
-        if not self.solution:
-            return {
-                'total_assignments': 0,
-                'courses_scheduled': 0,
-                'teachers_used': 0,
-                'rooms_used': 0,
-                'groups_scheduled': 0
-            }
-        
-        courses_scheduled = len(set(assignment['course_code'] for assignment in self.solution))
-        teachers_used = len(set(assignment['teacher_name'] for assignment in self.solution))
-        rooms_used = len(set(assignment['room_number'] for assignment in self.solution))
-        groups_scheduled = len(set(assignment['group_name'] for assignment in self.solution))
-        
-        return {
-            'total_assignments': len(self.solution),
-            'courses_scheduled': courses_scheduled,
-            'teachers_used': teachers_used,
-            'rooms_used': rooms_used,
-            'groups_scheduled': groups_scheduled
-        }
+        summary = {'total_assignments': len(self.solution)}
+        summary.update(zip(self.SUMMARY_STATS, self.summary_distinct))
+        return summary
     
     # CHANGE 15: REMOVED _validate_free_periods() method
     # This constraint was too strict and caused generation failures
@@ -2,66 +2,281 @@
 Utility functions for SmartTable - College Timetable Generator
 """
 
+import atexit
+import itertools
 import json
 import os
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ijson
+    _JSON_ERRORS = (json.JSONDecodeError, ijson.JSONError)
+except ImportError:
+    ijson = None
+    _JSON_ERRORS = (json.JSONDecodeError,)
+
+# Files larger than this (bytes) are parsed item by item when ijson is installed
+STREAM_THRESHOLD = 1_000_000
+
+
+# Sample timetable week: teaching days and (start, end) of each period
+_DAYS = ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday")
+_TIME_PERIODS = (
+    ("09:00", "10:00"), ("10:00", "11:00"), ("11:00", "12:00"), ("12:00", "13:00"),
+    ("13:00", "14:00"), ("14:00", "15:00"), ("15:00", "16:00"), ("16:00", "17:00")
+)
+
+
+def encode_json(data, indent=False):
+    """
+    Serialize data to UTF-8 JSON bytes, using orjson when it is installed
+    Compact by default; indent=True pretty-prints with two spaces
+    """
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(data, option=option)
+    if indent:
+        return json.dumps(data, indent=2, ensure_ascii=False).encode('utf-8')
+    return json.dumps(data, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+def decode_json(raw):
+    """
+    Parse JSON bytes or text, using orjson when it is installed
+    """
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+# filepath -> (st_mtime_ns, parsed records) of the last load
+_load_cache = {}
+
 
 def load_json(filename):
     """
     Load data from JSON file in data/ folder
     Returns empty list if file doesn't exist
+    Parsed files are cached until their modification time changes; callers
+    get fresh record dicts so in-place edits never leak into the cache.
+    Files above STREAM_THRESHOLD are streamed with ijson when available
+    instead of reading the whole document into memory first
     """
     data_dir = "data"
     filepath = os.path.join(data_dir, filename)
     
     try:
-        if os.path.exists(filepath):
-            with open(filepath, 'r', encoding='utf-8') as file:
-                return json.load(file)
-        else:
-            return []
-    except (json.JSONDecodeError, IOError) as e:
-        print(f"Error loading {filename}: {e}")
+        stat = os.stat(filepath)
+    except FileNotFoundError:
         return []
+    
+    cached = _load_cache.get(filepath)
+    if cached is None or cached[0] != stat.st_mtime_ns:
+        try:
+            with open(filepath, 'rb') as file:
+                if ijson is not None and stat.st_size > STREAM_THRESHOLD:
+                    records = list(ijson.items(file, 'item', use_float=True))
+                else:
+                    records = decode_json(file.read())
+            cached = (stat.st_mtime_ns, records)
+        except (*_JSON_ERRORS, IOError) as e:
+            print(f"Error loading {filename}: {e}")
+            return []
+        _load_cache[filepath] = cached
+    
+    return [dict(record) for record in cached[1]]
+
+
+def invalidate(filename):
+    """
+    Drop the cached copy of a file in data/ so the next load re-reads it
+    """
+    _load_cache.pop(os.path.join("data", filename), None)
 
 
 def save_json(filename, data):
     """
-    Save data to JSON file in data/ folder with proper formatting
+    Save data to JSON file in data/ folder
+    Serializes in one pass and writes the whole document with a single
+    write to a temporary file that atomically replaces the target
     """
     data_dir = "data"
-    
-    # Create data directory if it doesn't exist
-    if not os.path.exists(data_dir):
-        os.makedirs(data_dir)
-    
     filepath = os.path.join(data_dir, filename)
+    tmp_path = filepath + '.tmp'
     
     try:
-        with open(filepath, 'w', encoding='utf-8') as file:
-            json.dump(data, file, indent=2, ensure_ascii=False)
+        payload = encode_json(data, indent=True)
+        with open(tmp_path, 'wb', buffering=1 << 16) as file:
+            file.write(payload)
+        os.replace(tmp_path, filepath)
+        invalidate(filename)
         return True
     except IOError as e:
         print(f"Error saving {filename}: {e}")
         return False
 
 
+class DataStore:
+    """
+    In-memory copy of the JSON collections with deferred writeback
+    Routes read and mutate the cached lists; changed collections are only
+    marked dirty and written to disk by flush(). Each collection also has an
+    id -> record index so single-record updates and deletes skip list scans
+    """
+    
+    COLLECTIONS = ('courses', 'teachers', 'rooms', 'timeslots', 'groups', 'timetable')
+    
+    def __init__(self):
+        self.lock = threading.RLock()
+        self._flush_lock = threading.Lock()  # one writer per file at a time
+        self._data = {}
+        self._by_id = {}
+        self._dirty = set()
+        self.reload()
+    
+    def reload(self):
+        """Load every collection from disk, discarding unsaved changes"""
+        with self.lock:
+            self._data = {name: load_json(f'{name}.json') for name in self.COLLECTIONS}
+            self._by_id = {name: self._index(records) for name, records in self._data.items()}
+            self._dirty.clear()
+    
+    @staticmethod
+    def _index(records):
+        """Build the id -> record index of a collection"""
+        return {record['id']: record for record in records if 'id' in record}
+    
+    def get(self, name):
+        """Return a shallow copy of a collection"""
+        with self.lock:
+            return list(self._data[name])
+    
+    def count(self, name):
+        """Return the number of records in a collection"""
+        with self.lock:
+            return len(self._data[name])
+    
+    def add(self, name, record):
+        """Append one record to a collection"""
+        with self.lock:
+            self._data[name].append(record)
+            self._by_id[name][record['id']] = record
+            self._dirty.add(name)
+    
+    def extend(self, name, records):
+        """Append several records to a collection"""
+        with self.lock:
+            self._data[name].extend(records)
+            self._by_id[name].update(self._index(records))
+            self._dirty.add(name)
+    
+    def replace(self, name, records):
+        """Replace a whole collection"""
+        with self.lock:
+            self._data[name] = list(records)
+            self._by_id[name] = self._index(self._data[name])
+            self._dirty.add(name)
+    
+    def update(self, name, record_id, data):
+        """
+        Update a record by id, returning it or None if not found
+        Ids are assigned by the server, so an 'id' in data is ignored rather
+        than letting it take over another record's index entry
+        """
+        with self.lock:
+            record = self._by_id[name].get(record_id)
+            if record is None:
+                return None
+            record.update((key, value) for key, value in data.items() if key != 'id')
+            self._dirty.add(name)
+            return record
+    
+    def delete(self, name, record_id):
+        """
+        Remove a record by id in place; returns it, or None if not found
+        The index finds the record in O(1). Taking it out of the list is O(N)
+        whichever way its position is found, since the records after it shift
+        down to keep their order; stored positions would need the same O(N)
+        renumbering on every delete, so an identity scan is used instead
+        """
+        with self.lock:
+            record = self._by_id[name].pop(record_id, None)
+            if record is None:
+                return None
+            records = self._data[name]
+            for i, other in enumerate(records):
+                if other is record:
+                    del records[i]
+                    break
+            self._dirty.add(name)
+            return record
+    
+    def flush(self):
+        """
+        Write every dirty collection to disk
+        Records are copied under the lock, since update() changes them in
+        place, and serialized and written outside it so requests are not
+        held up by disk writes; a collection that fails to save stays dirty
+        """
+        with self._flush_lock:
+            with self.lock:
+                snapshot = {name: [dict(record) for record in self._data[name]] for name in self._dirty}
+                self._dirty.clear()
+            
+            for name, records in snapshot.items():
+                try:
+                    saved = save_json(f'{name}.json', records)
+                except Exception as e:
+                    print(f"Error saving {name}.json: {e}")
+                    saved = False
+                if not saved:
+                    with self.lock:
+                        self._dirty.add(name)
+    
+    def start_writeback(self, interval=1.0):
+        """Flush dirty collections every interval seconds and at exit"""
+        def run():
+            while True:
+                time.sleep(interval)
+                # An unexpected error must not end the thread, or later
+                # changes would only reach disk at exit
+                try:
+                    self.flush()
+                except Exception as e:
+                    print(f"Error writing back data: {e}")
+        
+        threading.Thread(target=run, name='datastore-writeback', daemon=True).start()
+        atexit.register(self.flush)
+
+
+# Seeded from the nanosecond clock so ids keep increasing across restarts
+_id_counter = itertools.count(time.time_ns())
+
+
 def generate_id():
     """
-    Generate unique ID using timestamp and random component
+    Generate unique ID from a process-wide monotonic counter
     """
-    import random
-    timestamp = int(time.time() * 1000)
-    random_component = random.randint(1000, 9999)
-    return f"{timestamp}_{random_component}"
+    return str(next(_id_counter))
 
 
 def initialize_data_files():
     """
-    Create empty JSON files if they don't exist
+    Create the data directory and empty JSON files if they don't exist
+    Runs once at startup, so save_json never has to check for the directory
     """
+    os.makedirs("data", exist_ok=True)
+    
     files_to_create = [
         'courses.json',
         'teachers.json', 
@@ -78,6 +293,13 @@ def initialize_data_files():
             print(f"Created empty {filename}")
 
 
+def _serialize_and_save(filename, objects):
+    """
+    Convert model objects to dicts and save them to a JSON file in data/
+    """
+    return save_json(filename, [obj.to_dict() for obj in objects])
+
+
 def create_sample_data():
     """
     Generate sample data for the timetable application
@@ -110,23 +332,12 @@ def create_sample_data():
     ]
     
     # Create sample time slots (Monday to Friday, 8 periods each day)
-    timeslots = []
-    days = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"]
-    time_periods = [
-        ("09:00", "10:00"), ("10:00", "11:00"), ("11:00", "12:00"), ("12:00", "13:00"),
-        ("13:00", "14:00"), ("14:00", "15:00"), ("15:00", "16:00"), ("16:00", "17:00")
+    timeslots = [
+        TimeSlot(id=generate_id(), day=day, period=period, start_time=start_time, end_time=end_time)
+        for day in _DAYS
+        for period, (start_time, end_time) in enumerate(_TIME_PERIODS, 1)
     ]
     
-    for day in days:
-        for period, (start_time, end_time) in enumerate(time_periods, 1):
-            timeslots.append(TimeSlot(
-                id=generate_id(),
-                day=day,
-                period=period,
-                start_time=start_time,
-                end_time=end_time
-            ))
-    
     # Create sample student groups
     groups = [
         StudentGroup(id=generate_id(), name="CS-A", semester=3, department="Computer Science"),
@@ -134,13 +345,18 @@ def create_sample_data():
         StudentGroup(id=generate_id(), name="IT-A", semester=3, department="Information Technology")
     ]
     
-    # Save all data to JSON files
-    save_json('courses.json', [course.to_dict() for course in courses])
-    save_json('teachers.json', [teacher.to_dict() for teacher in teachers])
-    save_json('rooms.json', [room.to_dict() for room in rooms])
-    save_json('timeslots.json', [timeslot.to_dict() for timeslot in timeslots])
-    save_json('groups.json', [group.to_dict() for group in groups])
-    save_json('timetable.json', [])  # Empty timetable initially
+    # Save all data to JSON files; each worker converts, encodes and writes
+    # its own collection, so the six files proceed independently
+    files = [
+        ('courses.json', courses),
+        ('teachers.json', teachers),
+        ('rooms.json', rooms),
+        ('timeslots.json', timeslots),
+        ('groups.json', groups),
+        ('timetable.json', [])  # Empty timetable initially
+    ]
+    with ThreadPoolExecutor(max_workers=len(files)) as pool:
+        list(pool.map(lambda item: _serialize_and_save(*item), files))
     
     print("Sample data created successfully!")
     return {